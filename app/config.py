@@ -8,6 +8,7 @@ Using Pydantic's BaseSettings gives us:
 3. Default values (fallback if not specified)
 """
 
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from typing import List
 
@@ -27,6 +28,25 @@ class Settings(BaseSettings):
     model_name: str = "yolov8n.pt"  # 'n' = nano (smallest, fastest)
     confidence_threshold: float = 0.5  # Minimum confidence to show detection (0-1)
     iou_threshold: float = 0.45  # Intersection over Union for removing duplicate boxes
+    # Export the model for faster inference: "none", "auto", "onnx", or "engine" (TensorRT)
+    # "auto" picks TensorRT (FP16) on a CUDA GPU and ONNX on CPU
+    # "engine" needs TensorRT installed separately (it isn't in requirements.txt)
+    model_export: str = "none"
+    # PyTorch CPU threads per worker process (0 = PyTorch's default: one per physical core)
+    # With N workers, set this to about (CPU cores / N) to avoid oversubscribing the CPU
+    torch_threads: int = 0
+
+    # Request Batching
+    # Concurrent requests arriving within batch_timeout_ms are run through YOLO together
+    max_batch_size: int = 8  # Max images per forward pass
+    batch_timeout_ms: float = 5.0  # How long to wait for more requests to join a batch
+    # Decoded images take far more memory than uploads (a 1080p JPEG is ~6MB as
+    # pixels), so only this many are decoded/queued at once - others wait
+    max_pending_images: int = 32
+
+    # Result Caching
+    # Repeat uploads of the same image (with the same thresholds) skip inference
+    prediction_cache_size: int = 128  # Number of results to keep (0 = disabled)
 
     # File Upload Limits
     max_file_size: int = 10_000_000  # 10MB in bytes
@@ -35,14 +55,31 @@ class Settings(BaseSettings):
     # Server Configuration
     host: str = "0.0.0.0"  # Listen on all network interfaces
     port: int = 8000
+    # Load the model when app.main is imported instead of at startup
+    # With gunicorn --preload this loads it ONCE in the master process, and the
+    # workers share its memory (copy-on-write) instead of each loading a copy
+    preload_model: bool = False
 
     # CORS (Cross-Origin Resource Sharing) - needed for web browser access
-    # ["*"] means allow all origins - restrict this in production!
+    # ["*"] means allow all origins - fine for development, but in production
+    # list your site explicitly, e.g. CORS_ORIGINS='["https://yoursite.com"]'
+    # (credentials/cookies are only allowed when origins are listed explicitly)
     cors_origins: List[str] = ["*"]
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
 
 
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Return the cached Settings instance
+
+    lru_cache makes sure the .env file is only parsed once, no matter how
+    many times this is called. It can also be used with FastAPI's Depends().
+    """
+    return Settings()
+
+
 # Create a single instance that we'll import everywhere
 # This is called the "Singleton pattern" - only one Settings object exists
-settings = Settings()
+settings = get_settings()
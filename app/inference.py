@@ -11,15 +11,114 @@ The model is only laoded ONCE when the app starts, not on every request.
 This saves time since model loading is expensive (takes a few seconds).
 """
 
-import time
-from typing import List
-from PIL import Image
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from time import perf_counter_ns
+from typing import List, Optional, Tuple
+from PIL import Image, UnidentifiedImageError
 import io
+import cv2
 import numpy as np
+import torch
+import torchvision  # noqa: F401 - imported now so its ops (e.g. NMS) load at startup, not on the first request
+from starlette.concurrency import run_in_threadpool
 from ultralytics import YOLO
+from ultralytics.utils import patches as ultralytics_patches
 
 from app.models import Detection, BoundingBox, PredictionResponse
-from app.config import settings
+from app.config import get_settings
+
+# Compiled (Cython) version of the _parse_results loop, if it has been built
+try:
+    from app._parse import parse_boxes
+except ImportError:
+    parse_boxes = None
+
+settings = get_settings()
+
+# Ultralytics replaces Image.open with a wrapper that tries to install HEIF
+# support (pi-heif) whenever opening fails. Headers are read with the original,
+# so rejecting an oversized image doesn't set that off.
+_pil_open = getattr(ultralytics_patches, "_image_open", Image.open)
+
+# Snapshot the defaults used on every request (avoids attribute lookups per call)
+_CONF_DEFAULT = settings.confidence_threshold
+_IOU_DEFAULT = settings.iou_threshold
+
+
+def resolve_thresholds(
+    confidence_threshold: Optional[float], iou_threshold: Optional[float]
+) -> Tuple[float, float]:
+    """Fill in the settings defaults for thresholds the request didn't set"""
+    if confidence_threshold is None:
+        confidence_threshold = _CONF_DEFAULT
+    if iou_threshold is None:
+        iou_threshold = _IOU_DEFAULT
+    return confidence_threshold, iou_threshold
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload's dimensions exceed Image.MAX_IMAGE_PIXELS"""
+
+
+class PredictionCache:
+    """
+    Small LRU (Least Recently Used) cache of prediction results
+
+    Demo pages, benchmarks and tests often upload the exact same image again
+    and again. Results are keyed by a hash of the image bytes plus the
+    thresholds, so a repeat upload skips inference entirely.
+    The oldest entry is dropped once maxsize is reached (0 disables the cache).
+
+    get() marks hits as cached=True with inference_time_ms=0, since no
+    inference ran for them.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()  # predict() runs in several threads at once
+
+    @property
+    def enabled(self) -> bool:
+        """False when maxsize is 0 - callers then skip hashing the upload at all"""
+        return self.maxsize > 0
+
+    @staticmethod
+    def key(image_bytes: bytes, confidence_threshold: float, iou_threshold: float) -> tuple:
+        """Build a cache key from the image contents and thresholds"""
+        # blake2b is in the standard library and hashes at ~1GB/s
+        digest = hashlib.blake2b(image_bytes, digest_size=16).digest()
+        return digest, confidence_threshold, iou_threshold
+
+    def get(self, key: tuple) -> Optional[PredictionResponse]:
+        """Return the cached response for key (marked as cached), or None"""
+        with self._lock:
+            response = self._entries.get(key)
+            if response is None:
+                return None
+            self._entries.move_to_end(key)  # Mark as recently used
+
+        # Report the hit honestly: no inference ran for this request
+        return response.model_copy(update={"cached": True, "inference_time_ms": 0.0})
+
+    def put(self, key: tuple, response: PredictionResponse):
+        """Store a response, evicting the least recently used one if full"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached responses"""
+        with self._lock:
+            self._entries.clear()
 
 
 class ObjectDetector:
@@ -36,9 +135,14 @@ class ObjectDetector:
         """
         self.model = None
         self.model_name = settings.model_name
+        self.class_names = ()  # Filled in by load_model()
+        self.cache = PredictionCache(settings.prediction_cache_size)
+        # Ultralytics' Model.predict() updates shared predictor state (conf/iou)
+        # on every call, so only one thread may run it at a time
+        self._predict_lock = threading.Lock()
         print(f"Initializing ObjectDetector with model: {self.model_name}")
 
-    def load_model(self):
+    def load_model(self, warmup: bool = True):
         """
         Load the YOLO model into memory
 
@@ -50,35 +154,201 @@ class ObjectDetector:
         - yolov8s.pt (small): Balanced
         - yolov8m.pt (medium): More accurate, slower
         - yolov8l.pt (large): Very accurate, much slower
+
+        Pass warmup=False when loading in a process that will fork afterwards
+        (gunicorn --preload); each worker should then call warmup() itself.
+        The predictor is still built here (single-threaded) so the workers
+        can share it - see _prepare_for_fork().
         """
+        # A different model gives different results, so forget old ones
+        self.cache.clear()
+
         try:
             print(f"Loading YOLO model: {self.model_name}")
             # Ultralytics will auto-download the model if not present
             self.model = YOLO(self.model_name)
             print(f"✓ Model loaded successfully!")
-            return True
         except Exception as e:
             print(f"✗ Error loading model: {str(e)}")
             return False
 
+        # Optionally swap the PyTorch model for a faster exported one
+        exported = self._load_exported_model()
+        if exported is not None:
+            self.model = exported
+
+        # Snapshot class names as a tuple: indexing a tuple by class ID is faster
+        # than a dict lookup, and this runs once per detection
+        names = self.model.names  # Dictionary: {0: 'person', 1: 'bicycle', ...}
+        self.class_names = tuple(names.get(i, str(i)) for i in range(max(names) + 1))
+
+        if warmup:
+            self.warmup()
+        elif exported is None:
+            self._prepare_for_fork()
+
+        return True
+
+    def _prepare_for_fork(self):
+        """
+        Build Ultralytics' predictor now, in the process that will fork
+
+        On its first predict() Ultralytics copies the model and fuses its layers
+        into a new set of weights. If that happens after fork(), every worker
+        allocates its own copy. Running one tiny prediction here creates those
+        weights once, so the workers share them (copy-on-write).
+
+        It runs with a single CPU thread so no thread pool is started - thread
+        pools don't survive fork(). Each worker starts its own on first use.
+        """
+        num_threads = torch.get_num_threads()
+        torch.set_num_threads(1)
+        try:
+            dummy_image = np.zeros((64, 64, 3), dtype=np.uint8)
+            with self._predict_lock:
+                self.model.predict(source=dummy_image, verbose=False)
+        except Exception as e:
+            # Only a memory optimization - workers will build it themselves
+            print(f"✗ Predictor setup before fork failed: {str(e)}")
+        finally:
+            torch.set_num_threads(num_threads)  # Workers inherit the normal setting
+
+    def warmup(self):
+        """
+        Run one dummy prediction so the first real request isn't slow
+
+        The first inference pays one-time costs (CUDA/cuDNN setup, picking
+        kernels, allocating memory) that can take a second or more.
+        Doing it here means the API is fully "hot" before /health says healthy.
+        """
+        # PyTorch defaults to one thread per physical core. With several gunicorn
+        # workers on one machine that oversubscribes the CPU, so TORCH_THREADS
+        # lets you give each worker a share instead (0 = keep PyTorch's default).
+        # Set it here, before the dummy run, so the thread pool is sized once.
+        if settings.torch_threads > 0:
+            torch.set_num_threads(settings.torch_threads)
+
+        try:
+            dummy_image = np.zeros((640, 640, 3), dtype=np.uint8)
+            with self._predict_lock:
+                self.model.predict(source=dummy_image, conf=0.99, iou=0.99, verbose=False)
+            print("✓ Model warmed up")
+        except Exception as e:
+            # Warmup is only an optimization - don't fail startup over it
+            print(f"✗ Model warmup failed: {str(e)}")
+
+    def export_format(self) -> Optional[str]:
+        """
+        Decide which export format to use based on settings.model_export
+
+        - "none": keep the PyTorch model
+        - "auto": TensorRT on a CUDA GPU, ONNX on CPU
+        - "onnx" / "engine": use that format
+        """
+        export = settings.model_export.lower()
+        if export == "none":
+            return None
+        if export == "auto":
+            return "engine" if torch.cuda.is_available() else "onnx"
+        return export
+
+    def _load_exported_model(self) -> Optional[YOLO]:
+        """
+        Export the model to ONNX/TensorRT (once) and load the exported file
+
+        Exported models run without PyTorch's Python overhead and with fused
+        layers; TensorRT also uses FP16 on the GPU. The exported file is saved
+        next to the .pt weights, so later startups just load it.
+
+        The export only accepts batches up to the max_batch_size it was built
+        with, so that size is part of the file name (e.g. yolov8n_b8.engine).
+        Changing MAX_BATCH_SIZE then triggers a fresh export.
+
+        Returns None (keep using the PyTorch model) if anything goes wrong.
+        """
+        export_format = self.export_format()
+        if export_format is None:
+            return None
+
+        weights_path = Path(self.model_name)
+        export_path = weights_path.with_name(
+            f"{weights_path.stem}_b{settings.max_batch_size}.{export_format}"
+        )
+        try:
+            if not export_path.exists():
+                print(f"Exporting {self.model_name} to {export_path} (first run only)...")
+                # dynamic + batch let the exported model accept batched requests
+                exported_file = self.model.export(
+                    format=export_format,
+                    half=export_format == "engine",  # FP16 only makes sense on the GPU
+                    dynamic=True,
+                    batch=settings.max_batch_size,
+                    imgsz=640,
+                )
+                # Ultralytics always names the file after the weights (yolov8n.onnx)
+                Path(exported_file).replace(export_path)
+
+            model = YOLO(str(export_path), task="detect")
+            print(f"✓ Using exported model: {export_path}")
+            return model
+        except Exception as e:
+            print(f"✗ Export to {export_format} failed, using PyTorch model: {str(e)}")
+            return None
+
     def is_loaded(self) -> bool:
         """Check if model is loaded"""
         return self.model is not None
 
-    def process_image(self, image_bytes: bytes) -> Image.Image:
+    def process_image(self, image_bytes: bytes) -> Tuple[np.ndarray, int, int]:
         """
-        Convert uploaded bytes to a PIL Image
+        Convert uploaded bytes to a BGR NumPy array
 
-        PIL (Python Imaging Library) is the standard library for image processing
-        io.BytesIO creates a file-like object from bytes (so PIL can read it)
-        """
-        image = Image.open(io.BytesIO(image_bytes))
+        Accepts bytes or a bytearray (what the /predict endpoint passes in).
 
-        # Convert to RGB if needed (some images are RGBA or grayscale)
-        if image.mode != "RGB":
-            image = image.convert("RGB")
+        cv2.imdecode decodes straight into a NumPy array, which YOLO accepts
+        directly (it expects BGR, OpenCV's default). This avoids building a PIL
+        image that Ultralytics would then have to convert again.
 
-        return image
+        Formats OpenCV can't decode fall back to PIL.
+
+        Images with more than Image.MAX_IMAGE_PIXELS pixels are rejected before
+        decoding (decompression bomb protection): a small, highly compressed
+        PNG can claim e.g. 15000x15000 pixels, which decodes to ~675MB.
+
+        Returns:
+            (image, width, height)
+
+        Raises:
+            ImageTooLargeError: if the image has too many pixels
+        """
+        # Only the header is read here - Image.open() doesn't decode the pixels
+        try:
+            with _pil_open(io.BytesIO(image_bytes)) as header:
+                width, height = header.size
+        except Image.DecompressionBombError as e:
+            # PIL itself refuses images over twice the limit
+            raise ImageTooLargeError(str(e)) from e
+        except UnidentifiedImageError:
+            pass  # Not a format PIL knows - leave it to OpenCV (which has its own cap)
+        else:
+            if Image.MAX_IMAGE_PIXELS and width * height > Image.MAX_IMAGE_PIXELS:
+                raise ImageTooLargeError(
+                    f"Image is {width}x{height} pixels, over the limit of {Image.MAX_IMAGE_PIXELS} pixels"
+                )
+
+        # np.frombuffer wraps the upload's memory without copying it
+        image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+        if image is None:
+            # Fallback: let PIL handle it, then convert RGB -> BGR for YOLO
+            # (some images are RGBA or grayscale, so convert to RGB first)
+            pil_image = Image.open(io.BytesIO(image_bytes))
+            if pil_image.mode != "RGB":
+                pil_image = pil_image.convert("RGB")
+            image = np.ascontiguousarray(np.asarray(pil_image)[:, :, ::-1])
+
+        image_height, image_width = image.shape[:2]
+        return image, image_width, image_height
 
     def predict(
         self, image_bytes: bytes, confidence_threshold: float = None, iou_threshold: float = None
@@ -99,46 +369,103 @@ class ObjectDetector:
         2. Pass image through YOLO model
         3. Filter results by confidence
         4. Format into our API response structure
+
+        This is safe to call from multiple threads at once: the result cache
+        has its own lock, and predict_batch() serializes the YOLO call itself
+        (Ultralytics stores each call's conf/iou on the shared predictor).
         """
         if not self.is_loaded():
             raise RuntimeError("Model not loaded. Call load_model() first.")
 
         # Use settings defaults if not provided
-        if confidence_threshold is None:
-            confidence_threshold = settings.confidence_threshold
-        if iou_threshold is None:
-            iou_threshold = settings.iou_threshold
+        confidence_threshold, iou_threshold = resolve_thresholds(
+            confidence_threshold, iou_threshold
+        )
+
+        # Return the cached result if this exact image was seen before
+        cache_key = None
+        if self.cache.enabled:
+            cache_key = self.cache.key(image_bytes, confidence_threshold, iou_threshold)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
 
         # Process image
-        image = self.process_image(image_bytes)
-        image_width, image_height = image.size
+        image, image_width, image_height = self.process_image(image_bytes)
+
+        response = self.predict_batch(
+            [(image, image_width, image_height)], confidence_threshold, iou_threshold
+        )[0]
+        if cache_key is not None:
+            self.cache.put(cache_key, response)
+        return response
+
+    def predict_batch(
+        self,
+        images: List[Tuple[np.ndarray, int, int]],
+        confidence_threshold: float,
+        iou_threshold: float,
+    ) -> List[PredictionResponse]:
+        """
+        Run object detection on several already-decoded images in one forward pass
+
+        Args:
+            images: List of (image, width, height) tuples from process_image()
+            confidence_threshold: Minimum confidence to include detection (0-1)
+            iou_threshold: IoU threshold for Non-Maximum Suppression
+
+        Returns:
+            One PredictionResponse per image, in the same order
+
+        YOLO processes a batch of images with almost the same overhead as a
+        single one, so grouping requests together increases throughput.
+        The reported inference time is the time for the whole batch.
+
+        The YOLO call is guarded by a lock, so concurrent callers run one
+        after another rather than racing on the shared predictor.
+        """
+        if not self.is_loaded():
+            raise RuntimeError("Model not loaded. Call load_model() first.")
 
         # Run inference and time it
-        start_time = time.time()
+        # perf_counter_ns is a monotonic clock - unlike time.time(), it can't
+        # jump if the system clock is adjusted mid-measurement
+        start_time = perf_counter_ns()
 
         # YOLO inference
         # conf: minimum confidence
         # iou: IoU threshold for NMS (Non-Maximum Suppression)
         # verbose: don't print progress
-        results = self.model.predict(source=image, conf=confidence_threshold, iou=iou_threshold, verbose=False)
-
-        inference_time = (time.time() - start_time) * 1000  # Convert to milliseconds
-
-        # Parse results
-        detections = self._parse_results(results[0])
+        # (one call at a time, otherwise calls can pick up each other's conf/iou)
+        with self._predict_lock:
+            results = self.model.predict(
+                source=[image for image, _, _ in images],
+                conf=confidence_threshold,
+                iou=iou_threshold,
+                verbose=False,
+            )
 
-        # Build response
-        response = PredictionResponse(
-            detections=detections,
-            num_detections=len(detections),
-            inference_time_ms=round(inference_time, 2),
-            image_dimensions=(image_width, image_height),
-            model_name=self.model_name,
-        )
+        inference_time = (perf_counter_ns() - start_time) / 1e6  # Convert to milliseconds
+
+        responses = []
+        for result, (_, image_width, image_height) in zip(results, images):
+            # Parse results
+            detections = self._parse_results(result, confidence_threshold)
+
+            # Build response
+            responses.append(
+                PredictionResponse(
+                    detections=detections,
+                    num_detections=len(detections),
+                    inference_time_ms=inference_time,
+                    image_dimensions=(image_width, image_height),
+                    model_name=self.model_name,
+                )
+            )
 
-        return response
+        return responses
 
-    def _parse_results(self, result) -> List[Detection]:
+    def _parse_results(self, result, confidence_threshold: float) -> List[Detection]:
         """
         Convert YOLO results to our Detection format
 
@@ -155,31 +482,230 @@ class ObjectDetector:
         if result.boxes is None or len(result.boxes) == 0:
             return detections
 
-        # Extract data from YOLO result
-        boxes = result.boxes.xyxy.cpu().numpy()  # Bounding boxes
-        confidences = result.boxes.conf.cpu().numpy()  # Confidence scores
-        class_ids = result.boxes.cls.cpu().numpy().astype(int)  # Class IDs
+        # Drop low-confidence boxes while the data is still on the device (GPU),
+        # so we only copy the boxes we keep. Not every backend applies `conf`
+        # exactly, so this also guarantees the threshold is respected.
+        boxes = result.boxes
+        data = boxes.data[boxes.conf >= confidence_threshold]
+        if len(data) == 0:
+            return detections
+
+        # data is one [N, 6] tensor: x_min, y_min, x_max, y_max, conf, cls
+        # Copy it to the CPU once instead of once per column
+        data = data.cpu().numpy()
 
         # Get class names (YOLO has 80 classes like 'person', 'car', 'dog', etc.)
-        class_names = result.names  # Dictionary: {0: 'person', 1: 'bicycle', ...}
+        class_names = self.class_names  # Tuple: ('person', 'bicycle', ...)
 
         # Build Detection objects
-        for box, conf, cls_id in zip(boxes, confidences, class_ids):
-            detection = Detection(
+        # model_construct skips Pydantic validation - YOLO output is already
+        # well-typed, so validating every box would just waste time
+        # (local variables are looked up faster than globals inside the loop)
+        make_detection = Detection.model_construct
+        make_bbox = BoundingBox.model_construct
+
+        # Use the compiled loop if available (see app/_parse.pyx)
+        if parse_boxes is not None:
+            return parse_boxes(
+                np.ascontiguousarray(data, dtype=np.float32), class_names, make_detection, make_bbox
+            )
+
+        # Extract data from YOLO result
+        # .tolist() converts the whole array to Python ints/floats in one C call,
+        # which is much faster than calling int()/float() on each element
+        boxes = data[:, :4].astype(np.int32).tolist()  # Bounding boxes
+        confidences = data[:, 4].tolist()  # Confidence scores
+        class_ids = data[:, 5].astype(np.int32).tolist()  # Class IDs
+
+        return [
+            make_detection(
                 class_name=class_names[cls_id],
-                confidence=float(conf),
-                bbox=BoundingBox(
-                    x_min=int(box[0]),
-                    y_min=int(box[1]),
-                    x_max=int(box[2]),
-                    y_max=int(box[3]),
+                confidence=conf,
+                bbox=make_bbox(
+                    x_min=box[0], y_min=box[1], x_max=box[2], y_max=box[3]
                 ),
             )
-            detections.append(detection)
+            for box, conf, cls_id in zip(boxes, confidences, class_ids)
+        ]
+
+
+class MicroBatcher:
+    """
+    Groups concurrent /predict requests into a single YOLO forward pass
+
+    Each request puts its decoded image on a queue and waits for a result.
+    A background task collects whatever arrives within a short window
+    (up to max_batch_size images), runs them through the model together,
+    and hands each result back to the request that is waiting for it.
+
+    Requests with different confidence/IoU thresholds can't share a YOLO
+    call, so each batch is split into groups by (confidence, iou) first.
+
+    At most max_pending requests hold a decoded image at once (a semaphore
+    around decode -> queue -> result). Under a burst the rest wait with only
+    their compressed upload in memory, instead of all decoding up front.
+    """
+
+    def __init__(
+        self,
+        detector: ObjectDetector,
+        max_batch_size: int,
+        timeout_ms: float,
+        max_pending: int = 32,
+    ):
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout_ms / 1000  # Convert to seconds
+        self.max_pending = max_pending
+        # Created in start() so they belong to the server's event loop
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def is_running(self) -> bool:
+        """Check if the background batching task is running"""
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the background batching task (call from inside the event loop)"""
+        if self.is_running():
+            return
+        self._queue = asyncio.Queue()
+        self._pending = asyncio.Semaphore(self.max_pending)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """
+        Cancel the background task
+
+        Requests still waiting in the queue (or in the batch being run) are
+        failed with a RuntimeError instead of being left hanging.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        while not self._queue.empty():
+            _, _, _, future = self._queue.get_nowait()
+            self._fail(future, RuntimeError("Server is shutting down"))
+
+    @staticmethod
+    def _fail(future: asyncio.Future, error: Exception):
+        """Fail a waiting request (unless it already finished or was cancelled)"""
+        if not future.done():
+            future.set_exception(error)
+
+    async def predict(
+        self, image_bytes: bytes, confidence_threshold: float = None, iou_threshold: float = None
+    ) -> PredictionResponse:
+        """
+        Queue an image for batched detection and wait for its result
+
+        Decoding happens here (in a worker thread) so a broken image only
+        fails its own request, not the whole batch. Repeat uploads are
+        answered from the detector's cache without being queued.
+
+        Waits first if max_pending images are already decoded and queued.
+        """
+        confidence_threshold, iou_threshold = resolve_thresholds(
+            confidence_threshold, iou_threshold
+        )
+
+        # Return the cached result if this exact image was seen before
+        # (hashing a large upload takes a few ms, so do it off the event loop)
+        cache = self.detector.cache
+        cache_key = None
+        if cache.enabled:
+            cache_key = await run_in_threadpool(
+                cache.key, image_bytes, confidence_threshold, iou_threshold
+            )
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        async with self._pending:
+            image, image_width, image_height = await run_in_threadpool(
+                self.detector.process_image, image_bytes
+            )
+            # stop() may have run while this request waited or decoded,
+            # and nothing would ever take it off the queue
+            if not self.is_running():
+                raise RuntimeError("Server is shutting down")
+
+            future = asyncio.get_running_loop().create_future()
+            self._queue.put_nowait(
+                ((image, image_width, image_height), confidence_threshold, iou_threshold, future)
+            )
+            response = await future
+        if cache_key is not None:
+            cache.put(cache_key, response)
+        return response
 
-        return detections
+    async def _collect(self) -> list:
+        """Wait for one request, then gather more until the window closes or the batch is full"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.timeout
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        """Background loop: collect a batch, run it, return the results"""
+        while True:
+            batch = await self._collect()
+            try:
+                await self._run_batch(batch)
+            except asyncio.CancelledError:
+                # Shutting down mid-batch - don't leave these requests hanging
+                for _, _, _, future in batch:
+                    self._fail(future, RuntimeError("Server is shutting down"))
+                raise
+
+    async def _run_batch(self, batch: list):
+        """Run one collected batch and hand each result to its waiting request"""
+        # Group by thresholds - each group is one YOLO call
+        groups = {}
+        for image, conf, iou, future in batch:
+            groups.setdefault((conf, iou), []).append((image, future))
+
+        for (conf, iou), items in groups.items():
+            try:
+                responses = await run_in_threadpool(
+                    self.detector.predict_batch, [image for image, _ in items], conf, iou
+                )
+            except Exception as e:
+                for _, future in items:
+                    self._fail(future, e)
+                continue
+
+            # The future may be cancelled if the client disconnected
+            for (_, future), response in zip(items, responses):
+                if not future.done():
+                    future.set_result(response)
 
 
 # Global instance - created once, used by all requests
 # This is initialized when the FastAPI app starts
-detector = ObjectDetector()
\ No newline at end of file
+detector = ObjectDetector()
+
+# Global batcher - started when the FastAPI app starts
+batcher = MicroBatcher(
+    detector,
+    max_batch_size=settings.max_batch_size,
+    timeout_ms=settings.batch_timeout_ms,
+    max_pending=settings.max_pending_images,
+)
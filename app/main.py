@@ -9,21 +9,27 @@ Endpoints we'll create:
 3. GET / - Root endpoint with API info
 
 Key Concepts:
-- @app.on_event("startup") runs once when server starts
+- lifespan() runs once when the server starts and once when it stops
 - @app.get() and @app.post() create API endpoints
 - Type hints automatically validate inputs
 """
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Receive, Scope, Send
+from contextlib import asynccontextmanager
 import logging
 from pathlib import Path
+from typing import Tuple
+import torch
 
-from app.config import settings
+from app.config import get_settings
 from app.models import HealthResponse, PredictionResponse
-from app.inference import detector
+from app.inference import detector, batcher, ImageTooLargeError
 
 # Set up logging (prints messages to console)
 logging.basicConfig(
@@ -31,59 +37,200 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+settings = get_settings()
+
+# Upload limits are checked on every /predict call, so snapshot them once
+# frozenset gives O(1) membership checks instead of scanning a list
+ALLOWED_EXT = frozenset(settings.allowed_extensions)
+MAX_FILE_SIZE = settings.max_file_size
+READ_CHUNK_SIZE = 64 * 1024  # Read uploads 64KB at a time
+# The request body also holds multipart boundaries and headers, so allow
+# a little more than the file itself
+MAX_REQUEST_SIZE = MAX_FILE_SIZE + 64 * 1024
+
+# File signatures ("magic numbers") for the image formats we accept
+# Every image format starts with a fixed byte pattern, so we can tell what
+# a file really is from its first few bytes
+# Each signature lists every name the format goes by in allowed_extensions
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ("jpg", "jpeg")),
+    (b"\x89PNG\r\n\x1a\n", ("png",)),
+    (b"BM", ("bmp",)),
+    (b"RIFF", ("webp",)),  # RIFF container - also checked for "WEBP" at bytes 8-12
+)
+
+
+def sniff_image_format(head: bytes) -> Tuple[str, ...]:
+    """
+    Detect the image format from the first bytes of a file
+
+    Returns all names for the format (e.g. ("jpg", "jpeg")), or an empty
+    tuple if it isn't a known image
+    """
+    for signature, names in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            if names == ("webp",) and head[8:12] != b"WEBP":
+                return ()
+            return names
+    return ()
+
+
+def is_allowed_image(head: bytes) -> bool:
+    """Check if the file is an image format listed in allowed_extensions"""
+    return not ALLOWED_EXT.isdisjoint(sniff_image_format(head))
+
+
+def preload_model():
+    """
+    Load the model at import time, before gunicorn forks its workers
+
+    The PyTorch weights (including the fused copy Ultralytics makes for
+    inference) are then shared by all workers via copy-on-write, so memory
+    stays at ~1x the model size instead of N x.
+    Warmup is left to each worker since thread pools don't survive fork().
+
+    There's nothing to share in two cases, so each worker loads its own model:
+    - CUDA: a CUDA context can't be used across fork()
+    - Exported models (ONNX/TensorRT): their runtime session is created inside
+      each process. We still run the export here so the file exists before the
+      workers start, instead of every worker exporting at the same time.
+    """
+    if torch.cuda.is_available():
+        logger.warning("PRELOAD_MODEL is ignored on CUDA; each worker will load its own model")
+        return
+
+    if detector.export_format() is not None:
+        logger.info("Model export is active; preparing the export but not preloading the model")
+        detector.load_model(warmup=False)
+        detector.model = None  # Each worker loads the exported file at startup
+        return
+
+    logger.info("Preloading model before workers start")
+    detector.load_model(warmup=False)
+
+
+if settings.preload_model:
+    preload_model()
+
+
+# Lifespan - runs ONCE when the server starts (before yield) and stops (after yield)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Initialize resources when the application starts, clean up when it stops
+
+    This is crucial for ML deployment:
+    - Load the model ONCE at startup (not on every request)
+    - Loading takes a few seconds, but we only do it once
+    - The model stays in memory for all requests
+    """
+    logger.info("=" * 50)
+    logger.info("Starting Object Detection API")
+    logger.info("=" * 50)
+
+    # Load the YOLO model (or just warm it up if it was preloaded before fork)
+    if detector.is_loaded():
+        detector.warmup()
+        success = True
+    else:
+        success = detector.load_model()
+
+    # Start the request batcher (groups concurrent requests into one forward pass)
+    batcher.start()
+
+    if not success:
+        logger.error("Failed to load model! API will not work properly.")
+    else:
+        logger.info(f"Model loaded: {settings.model_name}")
+        logger.info(f"Server running on http://{settings.host}:{settings.port}")
+        logger.info(f"API Documentation: http://localhost:{settings.port}/docs")
+        logger.info("=" * 50)
+
+    yield  # The app handles requests while we're paused here
+
+    # Shutdown: stop the batcher and free GPU memory
+    logger.info("Shutting down Object Detection API")
+    await batcher.stop()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
 # Create FastAPI application instance
 # This is the core object that handles all HTTP requests
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="Upload an image and receive object detection results with bounding boxes",
+    lifespan=lifespan,  # Startup/shutdown logic (see above)
     # Auto-generated docs will be at: http://localhost:8000/docs
 )
 
+# Upload Size Limit
+# Starlette reads the whole multipart body before our endpoint runs, so the
+# size check inside /predict comes too late to stop a huge upload.
+# This middleware rejects it from the Content-Length header, before the body
+# is read at all. (Registered before CORS so 413 responses still get CORS headers.)
+# It's plain ASGI rather than @app.middleware("http"): that wraps every
+# request (and response) in BaseHTTPMiddleware, which costs more than this check.
+class UploadSizeLimitMiddleware:
+    """Reject requests to path whose declared body is larger than max_size"""
+
+    def __init__(self, app: ASGIApp, path: str, max_size: int):
+        self.app = app
+        self.path = path
+        self.max_size = max_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and scope["path"] == self.path:
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    if value.isdigit() and int(value) > self.max_size:
+                        response = JSONResponse(
+                            status_code=413,
+                            content={
+                                "detail": f"File too large. Max size: {MAX_FILE_SIZE / 1_000_000}MB"
+                            },
+                        )
+                        await response(scope, receive, send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(UploadSizeLimitMiddleware, path="/predict", max_size=MAX_REQUEST_SIZE)
+
+
 # Add CORS middleware
 # CORS = Cross-Origin Resource Sharing
 # This allows your Hugo website (different domain) to call this API
 # Without CORS, browsers block requests from different origins (security feature)
+# Credentials (cookies) are only allowed with an explicit list of origins -
+# browsers reject credentials combined with a wildcard "*" origin anyway
+allow_all_origins = "*" in settings.cors_origins
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_origins,  # Which domains can access (["*"] = all)
-    allow_credentials=True,
-    allow_methods=["*"],  # Which HTTP methods (GET, POST, etc.)
+    allow_credentials=not allow_all_origins,
+    allow_methods=["GET", "POST"],  # Only the methods our endpoints use
     allow_headers=["*"],  # Which headers are allowed
 )
 
+# Add GZip middleware
+# Compresses responses larger than 1KB (only if the client supports gzip)
+# Detection results repeat the same keys and class names a lot, so JSON for
+# crowded images shrinks 5-10x - less data to send over slow connections
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Mount static files (for demo UI)
 # This serves the HTML/CSS/JS files from the static directory
 static_path = Path(__file__).parent.parent / "static"
 if static_path.exists():
     app.mount("/static", StaticFiles(directory=str(static_path)), name="static")
 
-
-# Startup Event - runs ONCE when the server starts
-@app.on_event("startup")
-async def startup_event():
-    """
-    Initialize resources when the application starts
-
-    This is crucial for ML deployment:
-    - Load the model ONCE at startup (not on every request)
-    - Loading takes a few seconds, but we only do it once
-    - The model stays in memory for all requests
-    """
-    logger.info("=" * 50)
-    logger.info("Starting Object Detection API")
-    logger.info("=" * 50)
-
-    # Load the YOLO model
-    success = detector.load_model()
-
-    if not success:
-        logger.error("Failed to load model! API will not work properly.")
-    else:
-        logger.info(f"Model loaded: {settings.model_name}")
-        logger.info(f"Server running on http://{settings.host}:{settings.port}")
-        logger.info(f"API Documentation: http://localhost:{settings.port}/docs")
-        logger.info("=" * 50)
+# Resolve the demo page once at startup instead of checking the disk on every
+# GET / (load balancers ping the root often)
+index_path = static_path / "index.html"
+index_exists = index_path.exists()
 
 
 # Root Endpoint - Serve demo UI
@@ -94,8 +241,7 @@ async def root():
 
     Try it: Open http://localhost:8000/ in your browser
     """
-    index_path = Path(__file__).parent.parent / "static" / "index.html"
-    if index_path.exists():
+    if index_exists:
         return FileResponse(index_path)
     else:
         # Fallback if static files not available
@@ -157,6 +303,8 @@ async def predict_objects(
     - List of detected objects (class name, confidence, bounding box)
     - Inference time (how long the detection took)
     - Image dimensions
+    - cached: true if the same image (with the same thresholds) was uploaded
+      recently and its result was reused - inference_time_ms is then 0
 
     Example using curl:
     ```
@@ -175,50 +323,71 @@ async def predict_objects(
         logger.error("Prediction attempted but model not loaded")
         raise HTTPException(status_code=503, detail="Model not loaded. Service unavailable.")
 
-    # Validate file type
-    # content_type tells us the file format (image/jpeg, image/png, etc.)
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(
-            status_code=400, detail=f"File must be an image. Got: {file.content_type}"
-        )
-
-    # Validate file extension
-    file_ext = file.filename.split(".")[-1].lower() if file.filename else ""
-    if file_ext not in settings.allowed_extensions:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File type .{file_ext} not allowed. Allowed: {settings.allowed_extensions}",
-        )
-
     try:
-        # Read the uploaded file into memory
-        # This reads the entire file as bytes
-        image_bytes = await file.read()
-
-        # Check file size
-        if len(image_bytes) > settings.max_file_size:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large. Max size: {settings.max_file_size / 1_000_000}MB",
-            )
+        # Read the uploaded file into memory in chunks
+        # By now Starlette has already received the whole upload (small files in
+        # memory, large ones spilled to a temp file) - the early rejection happens
+        # in UploadSizeLimitMiddleware above. Checking the size as we go here just keeps
+        # our in-memory copy bounded to MAX_FILE_SIZE (e.g. for chunked uploads
+        # that don't send a Content-Length header).
+        # A bytearray is grown in place and handed to the decoder as-is,
+        # without the extra copy BytesIO.getvalue() would make
+        buffer = bytearray()
+        total = 0
+        while chunk := await file.read(READ_CHUNK_SIZE):
+            # Validate file type from the first bytes of the file (its "magic number")
+            # This can't be faked by renaming the file or changing its content_type
+            if total == 0 and not is_allowed_image(chunk):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"File must be an image. Allowed: {settings.allowed_extensions}",
+                )
+            total += len(chunk)
+            if total > MAX_FILE_SIZE:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large. Max size: {MAX_FILE_SIZE / 1_000_000}MB",
+                )
+            buffer += chunk
+        if total == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty")
+        image_bytes = buffer
 
         logger.info(f"Processing image: {file.filename} ({len(image_bytes)} bytes)")
 
         # Run object detection
         # This is where the magic happens!
-        result = detector.predict(
-            image_bytes=image_bytes, confidence_threshold=confidence, iou_threshold=iou_threshold
-        )
+        # Requests are queued and run through YOLO in batches when the batcher
+        # is running; otherwise predict() runs directly in a worker thread.
+        # Either way the event loop stays free to accept other requests.
+        if batcher.is_running():
+            result = await batcher.predict(
+                image_bytes=image_bytes, confidence_threshold=confidence, iou_threshold=iou_threshold
+            )
+        else:
+            result = await run_in_threadpool(
+                detector.predict,
+                image_bytes=image_bytes,
+                confidence_threshold=confidence,
+                iou_threshold=iou_threshold,
+            )
 
         logger.info(
             f"Detection complete: {result.num_detections} objects found in {result.inference_time_ms:.2f}ms"
         )
 
-        return result
+        # We built this response ourselves, so there's no need for FastAPI to
+        # validate it again against response_model and convert it to a dict.
+        # model_dump_json() serializes straight to JSON in Pydantic's compiled core.
+        # (response_model above is still used for the API docs)
+        return Response(content=result.model_dump_json(), media_type="application/json")
 
     except HTTPException:
         # Re-raise HTTP exceptions (already handled above)
         raise
+    except ImageTooLargeError as e:
+        # Dimensions over the pixel limit (possible decompression bomb)
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         # Catch any unexpected errors
         logger.error(f"Error during prediction: {str(e)}", exc_info=True)
@@ -61,6 +61,11 @@ class PredictionResponse(BaseModel):
     inference_time_ms: float = Field(..., description="Time taken for inference in milliseconds")
     image_dimensions: Tuple[int, int] = Field(..., description="Original image size (width, height)")
     model_name: str = Field(..., description="Name of the model used")
+    cached: bool = Field(
+        False,
+        description="True if this result was reused from an earlier upload of the same image "
+        "(no inference ran, so inference_time_ms is 0)",
+    )
 
     model_config = {
         "json_schema_extra": {
@@ -81,6 +86,7 @@ class PredictionResponse(BaseModel):
                 "inference_time_ms": 145.3,
                 "image_dimensions": [1920, 1080],
                 "model_name": "yolov8n.pt",
+                "cached": False,
             }
         }
     }
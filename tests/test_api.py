@@ -6,8 +6,12 @@ Tests to verify that the endpoints work correctly.
 TestClient simulates HTTP requests without actually starting a server.
 """
 
+import struct
+import zlib
+
 from fastapi.testclient import TestClient
-from app.main import app
+from app import main
+from app.main import app, is_allowed_image, sniff_image_format, MAX_REQUEST_SIZE
 
 # Create test client
 # This lets us make requests to the app without running a server
@@ -79,6 +83,85 @@ def test_predict_with_invalid_file():
     assert response.status_code in [400, 503]
 
 
+def test_predict_rejects_oversized_upload():
+    """
+    Test that uploads over the size limit are rejected with 413
+
+    This is checked from the Content-Length header before the body is parsed,
+    so it happens even when the model isn't loaded
+    """
+    too_big = b"\xff\xd8\xff" + b"\x00" * (MAX_REQUEST_SIZE + 1)
+    response = client.post("/predict", files={"file": ("big.jpg", too_big, "image/jpeg")})
+
+    assert response.status_code == 413
+
+
+def make_png(width: int, height: int) -> bytes:
+    """
+    Build a valid black-and-white PNG of any size
+
+    At 1 bit per pixel the pixel data compresses to almost nothing, so even a
+    huge image is only a few KB on disk (a "decompression bomb")
+    """
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    row = b"\x00" * (1 + (width + 7) // 8)  # Filter byte + packed pixels
+    header = struct.pack(">IIBBBBB", width, height, 1, 0, 0, 0, 0)  # 1-bit grayscale
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(row * height, 9))
+        + chunk(b"IEND", b"")
+    )
+
+
+def test_predict_rejects_too_many_pixels(monkeypatch):
+    """
+    Test that an image whose dimensions exceed the pixel limit is rejected
+
+    The check reads only the PNG header, so the image is never decoded
+    (and no model is needed, since it fails before inference)
+    """
+    bomb = make_png(15000, 15000)  # ~28KB on disk, ~675MB once decoded
+    assert len(bomb) < main.MAX_FILE_SIZE
+
+    monkeypatch.setattr(main.detector, "is_loaded", lambda: True)
+    response = client.post("/predict", files={"file": ("bomb.png", bomb, "image/png")})
+
+    assert response.status_code == 413
+
+
+def test_sniff_image_format():
+    """
+    Test that image formats are detected from their magic bytes
+
+    The file name and content_type don't matter - only the file contents
+    """
+    assert sniff_image_format(b"\xff\xd8\xff\xe0" + b"\x00" * 8) == ("jpg", "jpeg")
+    assert sniff_image_format(b"\x89PNG\r\n\x1a\n" + b"\x00" * 4) == ("png",)
+    assert sniff_image_format(b"BM" + b"\x00" * 10) == ("bmp",)
+    assert sniff_image_format(b"RIFF\x00\x00\x00\x00WEBP") == ("webp",)
+
+    # RIFF is also used by non-image formats like WAV audio
+    assert sniff_image_format(b"RIFF\x00\x00\x00\x00WAVE") == ()
+    assert sniff_image_format(b"not an image") == ()
+
+
+def test_allowed_image_accepts_any_format_alias(monkeypatch):
+    """
+    Test that a JPEG is accepted whether allowed_extensions says "jpg" or "jpeg"
+    """
+    jpeg_head = b"\xff\xd8\xff\xe0" + b"\x00" * 8
+
+    monkeypatch.setattr(main, "ALLOWED_EXT", frozenset(["jpeg", "png"]))
+    assert is_allowed_image(jpeg_head)
+
+    monkeypatch.setattr(main, "ALLOWED_EXT", frozenset(["png"]))
+    assert not is_allowed_image(jpeg_head)
+
+
 # To run these tests:
 # 1. Make sure you're in the project root directory
 # 2. Activate virtual environment: source venv/bin/activate
@@ -0,0 +1,231 @@
+"""
+Micro-Batcher Tests
+
+Tests for MicroBatcher, which groups concurrent requests into one YOLO call.
+
+A stub detector stands in for the real model, so these run without
+loading any weights. Each test runs its own event loop with asyncio.run().
+"""
+
+import asyncio
+import threading
+
+from app.config import settings
+from app.inference import MicroBatcher, PredictionCache
+
+
+class StubDetector:
+    """
+    Minimal stand-in for ObjectDetector
+
+    process_image() passes the bytes through unchanged and predict_batch()
+    returns a string per image, recording every call it receives.
+    """
+
+    def __init__(self, error: Exception = None, release: threading.Event = None):
+        self.cache = PredictionCache(0)
+        self.decoded = []
+        self.calls = []
+        self.error = error
+        self.release = release  # If set, predict_batch waits for it
+
+    def process_image(self, image_bytes):
+        self.decoded.append(image_bytes)
+        return image_bytes, 1, 1
+
+    def predict_batch(self, images, confidence_threshold, iou_threshold):
+        self.calls.append(([image for image, _, _ in images], confidence_threshold, iou_threshold))
+        if self.release is not None:
+            self.release.wait(timeout=5)
+        if self.error is not None:
+            raise self.error
+        return [f"result:{image.decode()}" for image, _, _ in images]
+
+
+def run_batcher(detector, requests, max_batch_size=8, timeout_ms=50):
+    """
+    Start a batcher, send all requests at once, and return their results
+
+    Each request is (image_bytes, confidence, iou). Exceptions are returned
+    in place of results instead of being raised.
+    """
+
+    async def main():
+        batcher = MicroBatcher(detector, max_batch_size=max_batch_size, timeout_ms=timeout_ms)
+        batcher.start()
+        try:
+            return await asyncio.gather(
+                *(batcher.predict(image, conf, iou) for image, conf, iou in requests),
+                return_exceptions=True,
+            )
+        finally:
+            await batcher.stop()
+
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_call():
+    """
+    Requests arriving within the batching window run as one YOLO call
+    """
+    detector = StubDetector()
+
+    results = run_batcher(detector, [(b"a", 0.5, 0.45), (b"b", 0.5, 0.45), (b"c", 0.5, 0.45)])
+
+    # Each request gets its own result back, in order
+    assert results == ["result:a", "result:b", "result:c"]
+
+    # One call with all three images (queue order depends on thread timing)
+    assert len(detector.calls) == 1
+    images, conf, iou = detector.calls[0]
+    assert sorted(images) == [b"a", b"b", b"c"]
+    assert (conf, iou) == (0.5, 0.45)
+
+
+def test_batches_are_grouped_by_thresholds():
+    """
+    Requests with different confidence/IoU thresholds get separate YOLO calls
+    """
+    detector = StubDetector()
+
+    results = run_batcher(detector, [(b"a", 0.5, 0.45), (b"b", 0.7, 0.45), (b"c", 0.5, 0.45)])
+
+    assert results == ["result:a", "result:b", "result:c"]
+    calls = sorted((conf, sorted(images)) for images, conf, _ in detector.calls)
+    assert calls == [(0.5, [b"a", b"c"]), (0.7, [b"b"])]
+
+
+def test_default_thresholds_are_filled_in():
+    """
+    Requests that don't set thresholds use the settings defaults
+    """
+    detector = StubDetector()
+    results = run_batcher(detector, [(b"a", None, None)])
+
+    assert results == ["result:a"]
+    _, conf, iou = detector.calls[0]
+    assert (conf, iou) == (settings.confidence_threshold, settings.iou_threshold)
+
+
+def test_disabled_cache_skips_hashing(monkeypatch):
+    """
+    With the cache disabled (size 0), uploads are never hashed
+    """
+    detector = StubDetector()
+
+    def fail_key(*args):
+        raise AssertionError("cache.key() called with the cache disabled")
+
+    monkeypatch.setattr(detector.cache, "key", fail_key)
+
+    assert run_batcher(detector, [(b"a", 0.5, 0.45)]) == ["result:a"]
+
+
+def test_max_batch_size_is_respected():
+    """
+    A batch never holds more than max_batch_size images
+    """
+    detector = StubDetector()
+
+    requests = [(str(i).encode(), 0.5, 0.45) for i in range(5)]
+    results = run_batcher(detector, requests, max_batch_size=2)
+
+    assert results == [f"result:{i}" for i in range(5)]
+    assert [len(images) for images, _, _ in detector.calls] == [2, 2, 1]
+
+
+def test_errors_are_sent_to_every_request_in_the_group():
+    """
+    If the YOLO call fails, every request in that group gets the error
+    """
+    detector = StubDetector(error=ValueError("inference failed"))
+
+    results = run_batcher(detector, [(b"a", 0.5, 0.45), (b"b", 0.5, 0.45)])
+
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelled_request_does_not_break_the_batch():
+    """
+    A client that disconnects (cancelled future) doesn't affect the others
+    """
+    detector = StubDetector()
+
+    async def main():
+        batcher = MicroBatcher(detector, max_batch_size=8, timeout_ms=50)
+        batcher.start()
+        try:
+            cancelled = asyncio.ensure_future(batcher.predict(b"a", 0.5, 0.45))
+            kept = asyncio.ensure_future(batcher.predict(b"b", 0.5, 0.45))
+            await asyncio.sleep(0.01)  # Let both requests reach the queue
+            cancelled.cancel()
+
+            result = await kept
+            # The batcher keeps working for later requests
+            later = await batcher.predict(b"c", 0.5, 0.45)
+            return result, later, batcher.is_running()
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(main()) == ("result:b", "result:c", True)
+
+
+def test_max_pending_limits_decoded_images():
+    """
+    Only max_pending images are decoded at once - later requests wait their
+    turn without being decoded
+    """
+    release = threading.Event()
+    detector = StubDetector(release=release)
+
+    async def main():
+        batcher = MicroBatcher(detector, max_batch_size=8, timeout_ms=1, max_pending=2)
+        batcher.start()
+        try:
+            requests = [
+                asyncio.ensure_future(batcher.predict(image, 0.5, 0.45))
+                for image in (b"a", b"b", b"c")
+            ]
+            await asyncio.sleep(0.05)  # The first two are decoded and running
+            decoded_while_busy = len(detector.decoded)
+
+            release.set()
+            return decoded_while_busy, await asyncio.gather(*requests)
+        finally:
+            await batcher.stop()
+
+    decoded_while_busy, results = asyncio.run(main())
+
+    assert decoded_while_busy == 2
+    assert results == ["result:a", "result:b", "result:c"]
+
+
+def test_stop_fails_waiting_requests():
+    """
+    Stopping the batcher fails requests that are queued or mid-batch
+    instead of leaving them waiting forever
+    """
+    release = threading.Event()
+    detector = StubDetector(release=release)
+
+    async def main():
+        batcher = MicroBatcher(detector, max_batch_size=1, timeout_ms=1)
+        batcher.start()
+
+        in_flight = asyncio.ensure_future(batcher.predict(b"a", 0.5, 0.45))
+        queued = asyncio.ensure_future(batcher.predict(b"b", 0.5, 0.45))
+        await asyncio.sleep(0.05)  # "a" is now running, "b" is waiting in the queue
+
+        # Let the stub finish shortly after stop() starts cancelling
+        asyncio.get_running_loop().call_later(0.05, release.set)
+        await batcher.stop()
+
+        return await asyncio.gather(in_flight, queued, return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+# To run these tests:
+# pytest tests/test_batcher.py -v
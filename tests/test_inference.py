@@ -0,0 +1,155 @@
+"""
+Inference Tests
+
+Tests for the parts of app/inference.py that don't need a loaded model:
+turning YOLO output into our Detection format, and the prediction cache.
+"""
+
+import pytest
+import torch
+from ultralytics.engine.results import Boxes
+
+from app import inference
+from app.inference import ObjectDetector, PredictionCache
+from app.models import PredictionResponse
+
+
+class FakeResult:
+    """Stand-in for a YOLO Results object - only .boxes is used"""
+
+    def __init__(self, data):
+        self.boxes = Boxes(torch.as_tensor(data, dtype=torch.float32), orig_shape=(720, 1280))
+
+
+# Rows are: x_min, y_min, x_max, y_max, confidence, class_id
+BOXES = [
+    [10.7, 20.2, 110.9, 220.5, 0.91, 0],
+    [-0.6, 5.0, 50.0, 60.0, 0.55, 2],  # Slightly outside the image
+    [300.0, 400.0, 500.0, 600.0, 0.30, 1],  # Below the 0.5 threshold
+]
+
+
+def make_detector():
+    """Create a detector with class names set, without loading a model"""
+    detector = ObjectDetector()
+    detector.class_names = ("person", "bicycle", "car")
+    return detector
+
+
+def parse(monkeypatch, compiled: bool):
+    """Run _parse_results through the Cython or the pure Python path"""
+    if not compiled:
+        monkeypatch.setattr(inference, "parse_boxes", None)
+    detections = make_detector()._parse_results(FakeResult(BOXES), confidence_threshold=0.5)
+    return [detection.model_dump() for detection in detections]
+
+
+def test_parse_results(monkeypatch):
+    """
+    Test that YOLO boxes are converted and filtered by confidence
+
+    Coordinates are truncated to whole pixels
+    """
+    detections = parse(monkeypatch, compiled=False)
+
+    assert detections == [
+        {
+            "class_name": "person",
+            "confidence": pytest.approx(0.91),
+            "bbox": {"x_min": 10, "y_min": 20, "x_max": 110, "y_max": 220},
+        },
+        {
+            "class_name": "car",
+            "confidence": pytest.approx(0.55),
+            "bbox": {"x_min": 0, "y_min": 5, "x_max": 50, "y_max": 60},
+        },
+    ]
+
+
+def test_parse_results_empty():
+    """
+    Test that an image with no detections gives an empty list
+    """
+    assert make_detector()._parse_results(FakeResult(torch.zeros((0, 6))), 0.5) == []
+
+
+@pytest.mark.skipif(inference.parse_boxes is None, reason="Cython extension not built")
+def test_compiled_parse_matches_python(monkeypatch):
+    """
+    Test that the Cython loop (app/_parse.pyx) gives exactly the same output
+
+    Build it first with: cythonize -i app/_parse.pyx
+    """
+    compiled = parse(monkeypatch, compiled=True)
+    python = parse(monkeypatch, compiled=False)
+
+    assert compiled == python
+
+
+def make_response():
+    """A small PredictionResponse to store in the cache"""
+    return PredictionResponse(
+        detections=[],
+        num_detections=0,
+        inference_time_ms=12.5,
+        image_dimensions=(640, 480),
+        model_name="yolov8n.pt",
+    )
+
+
+def test_cache_hit():
+    """
+    Test that a stored response is returned for the same image and thresholds
+
+    Hits are marked as cached, with an inference time of 0 (no inference ran)
+    """
+    cache = PredictionCache(maxsize=2)
+    response = make_response()
+    cache.put(cache.key(b"image", 0.5, 0.45), response)
+
+    hit = cache.get(cache.key(b"image", 0.5, 0.45))
+    assert hit.detections == response.detections
+    # Different thresholds or a different image are separate entries
+    assert cache.get(cache.key(b"image", 0.6, 0.45)) is None
+    assert cache.get(cache.key(b"other", 0.5, 0.45)) is None
+
+    assert hit.cached is True
+    assert hit.inference_time_ms == 0.0
+    # The stored response itself is unchanged
+    assert response.cached is False
+    assert response.inference_time_ms == 12.5
+
+
+def test_cache_evicts_least_recently_used():
+    """
+    Test that the entry used longest ago is dropped when the cache is full
+    """
+    cache = PredictionCache(maxsize=2)
+    cache.put("a", make_response())
+    cache.put("b", make_response())
+    cache.get("a")  # "a" is now more recently used than "b"
+    cache.put("c", make_response())
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_cache_disabled_and_clear():
+    """
+    Test that maxsize=0 stores nothing and clear() empties the cache
+    """
+    disabled = PredictionCache(maxsize=0)
+    assert not disabled.enabled
+    disabled.put("a", make_response())
+    assert disabled.get("a") is None
+
+    cache = PredictionCache(maxsize=2)
+    assert cache.enabled
+    cache.put("a", make_response())
+    cache.clear()
+    assert cache.get("a") is None
+
+
+# To run these tests:
+# pytest tests/test_inference.py -v